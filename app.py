@@ -1,20 +1,49 @@
-from flask import Flask, request, redirect, render_template, url_for, Response, make_response
+from flask import Flask, request, redirect, render_template, url_for, Response, make_response, g
 from urllib.parse import urlparse
 import string
 import random
 import re
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+import httpx
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+from cachetools import TTLCache
 import os
 from dotenv import load_dotenv
 import logging
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
+from jinja2 import FileSystemBytecodeCache
+from flask.helpers import get_debug_flag
 import secrets
+import hmac
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE  # Upload kebesaran langsung ditolak 413
 logging.basicConfig(level=logging.DEBUG)
 load_dotenv()
 
+# Production: template di-compile sekali saat start, tanpa cek stat() tiap render
+if not (app.debug or get_debug_flag()):
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
+    app.jinja_env.auto_reload = False
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()  # Di /tmp, dipakai ulang saat warm start
+for template_name in app.jinja_env.list_templates(extensions=['html']):
+    app.jinja_env.get_template(template_name)
+
+# X-Forwarded-For hanya dipercaya sebanyak hop proxy yang dikonfigurasi (mis. 1 di Vercel)
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
@@ -26,20 +55,48 @@ try:
 except Exception as e:
     raise ValueError(f"Gagal menginisialisasi Supabase: {str(e)}")
 
+# Keep-alive pool supaya warm invocation tidak handshake TLS ulang ke Supabase
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=30, keepalive_expiry=30.0)
+HTTP_TIMEOUT = 10.0
+
+def _pooled_client(client):
+    pooled = type(client)(
+        base_url=client.base_url,
+        headers=client.headers,
+        timeout=HTTP_TIMEOUT,
+        limits=HTTP_LIMITS,
+        verify=True,  # Sama dengan supabase-py 2.7.1 untuk postgrest & storage
+        follow_redirects=True,
+        http2=True
+    )
+    client.close()
+    return pooled
+
+supabase.postgrest.session = _pooled_client(supabase.postgrest.session)
+supabase.storage.session = supabase.storage._client = _pooled_client(supabase.storage._client)
+
+# Untuk query Supabase yang saling independen dalam satu request
+_executor = ThreadPoolExecutor(max_workers=4)
+
+_CUSTOM_CODE_RE = re.compile(r'\A[a-zA-Z0-9_-]{3,10}\Z')
+_ALPHABET = string.ascii_letters + string.digits
+_SYSRAND = random.SystemRandom()
+RANGE_NOT_SATISFIABLE = 'PGRST103'
+UNIQUE_VIOLATION = '23505'  # Postgres error code, butuh UNIQUE index di links.short_code & users.email
+
 # Helper functions
 def now_utc():
     return datetime.now(timezone.utc)
 
 def generate_short_code(length=6):
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for _ in range(length))
+    return ''.join(_SYSRAND.choices(_ALPHABET, k=length))
 
 def is_valid_custom_code(code):
-    return bool(re.match(r'^[a-zA-Z0-9_-]{3,10}$', code))
+    return _CUSTOM_CODE_RE.match(code) is not None
 
 def code_exists(short_code):
     try:
-        response = supabase.table('links').select('short_code').eq('short_code', short_code).execute()
+        response = supabase.table('links').select('short_code').eq('short_code', short_code).limit(1).execute()
         return len(response.data) > 0
     except Exception as e:
         logging.error(f"Error saat cek kode: {str(e)}")
@@ -50,7 +107,7 @@ def email_exists(email, exclude_user_id=None):
         query = supabase.table('users').select('email').eq('email', email)
         if exclude_user_id:
             query = query.neq('id', exclude_user_id)
-        response = query.execute()
+        response = query.limit(1).execute()
         return len(response.data) > 0
     except Exception as e:
         logging.error(f"Error saat cek email: {str(e)}")
@@ -58,7 +115,7 @@ def email_exists(email, exclude_user_id=None):
 
 def folder_name_exists(name, user_id):
     try:
-        response = supabase.table('folders').select('name').eq('name', name).eq('user_id', user_id).execute()
+        response = supabase.table('folders').select('name').eq('name', name).eq('user_id', user_id).limit(1).execute()
         return len(response.data) > 0
     except Exception as e:
         logging.error(f"Error saat cek nama folder: {str(e)}")
@@ -74,8 +131,13 @@ def store_link(short_code, content_type, content, user_id=None, folder_id=None):
         }
         if user_id:
             data['user_id'] = user_id
-        supabase.table('links').insert(data).execute()
+        response = supabase.table('links').insert(data, returning=ReturnMethod.minimal).execute()
         logging.debug(f"Stored link: short_code={short_code}, folder_id={folder_id}, user_id={user_id}")
+        return response
+    except APIError as e:
+        if e.code != UNIQUE_VIOLATION:
+            logging.error(f"Error saat menyimpan link: {str(e)}")
+        raise
     except Exception as e:
         logging.error(f"Error saat menyimpan link: {str(e)}")
         raise
@@ -89,7 +151,7 @@ def delete_link(short_code, user_id):
         if link['content_type'] in ('image', 'document'):
             file_name = link['content'].split('/content/')[-1]
             supabase.storage.from_('content').remove([file_name])
-        supabase.table('links').delete().eq('short_code', short_code).eq('user_id', user_id).execute()
+        supabase.table('links').delete(returning=ReturnMethod.minimal).eq('short_code', short_code).eq('user_id', user_id).execute()
         logging.debug(f"Deleted link: short_code={short_code}, user_id={user_id}")
         return True
     except Exception as e:
@@ -102,40 +164,129 @@ def update_short_code(old_code, new_code, user_id):
             return False, "Kode kustom sudah digunakan!"
         if not is_valid_custom_code(new_code):
             return False, "Kode kustom tidak valid! Gunakan 3-10 karakter (huruf, angka, _, -)."
-        supabase.table('links').update({'short_code': new_code}).eq('short_code', old_code).eq('user_id', user_id).execute()
+        supabase.table('links').update({'short_code': new_code}, returning=ReturnMethod.minimal).eq('short_code', old_code).eq('user_id', user_id).execute()
         logging.debug(f"Updated short_code: {old_code} to {new_code}, user_id={user_id}")
         return True, None
     except Exception as e:
         logging.error(f"Error saat update short_code: {str(e)}")
         return False, str(e)
 
-# Session management via Supabase (no SECRET_KEY)
+# Session management: token bertanda HMAC, tabel sessions hanya jadi daftar revoke
 SESSION_COOKIE_NAME = "session_id"
 SESSION_MAX_DAYS = 7
+SESSION_CACHE_TTL = 30  # detik
+SESSION_CACHE_MAX = 1024
+REVOKED_REFRESH_SECONDS = 60
+REVOKED_RETRY_SECONDS = 5
+REVOKED_PAGE_SIZE = 1000
+
+SECRET_KEY = (os.getenv('SECRET_KEY') or os.getenv('FLASK_SECRET_KEY') or '').encode()
+if not SECRET_KEY:
+    raise ValueError("SECRET_KEY harus diatur di environment variables.")
+
+_session_cache = {}  # token -> (user, expires_at monotonic)
+_revoked_tokens = None  # None = daftar revoke belum pernah berhasil dimuat
+_revoked_next_refresh = 0.0
+_recent_revocations = {}  # token -> monotonic, logout di proses ini yang mungkin belum ada di snapshot
+_SIGNATURE_RE = re.compile(r'\A[0-9a-f]{32}\Z')
+_EXPIRY_RE = re.compile(r'\A[0-9]{1,12}\Z')
+_revoked_lock = threading.Lock()  # melindungi state di atas, tidak dipegang saat query
+_revoked_refresh_lock = threading.Lock()  # hanya satu thread yang memuat ulang
+
+def _sign(payload):
+    return hmac.new(SECRET_KEY, payload.encode(), hashlib.sha256).hexdigest()[:32]
 
 def create_session(user_id):
-    token = secrets.token_urlsafe(48)
     expires_at = now_utc() + timedelta(days=SESSION_MAX_DAYS)
+    payload = f"{user_id}.{int(expires_at.timestamp())}.{secrets.token_urlsafe(16)}"
+    token = f"{payload}.{_sign(payload)}"
     supabase.table('sessions').insert({
         'id': token,
         'user_id': user_id,
         'expires_at': expires_at.isoformat(),
         'revoked': False
-    }).execute()
+    }, returning=ReturnMethod.minimal).execute()
     return token
 
+def verify_session_token(token):
+    parts = token.split('.')
+    if len(parts) != 4:
+        return None
+    user_id, exp, nonce, signature = parts
+    # Cookie rusak/asal-asalan dianggap belum login; compare_digest menolak str non-ASCII
+    if not _SIGNATURE_RE.match(signature) or not _EXPIRY_RE.match(exp):
+        return None
+    if not hmac.compare_digest(signature.encode(), _sign(f"{user_id}.{exp}.{nonce}").encode()):
+        return None
+    if int(exp) <= now_utc().timestamp():
+        return None
+    return user_id
+
+def _load_revoked_tokens():
+    revoked = set()
+    offset = 0
+    while True:
+        response = supabase.table('sessions').select('id').eq('revoked', True).gt('expires_at', now_utc().isoformat()).order('id').range(offset, offset + REVOKED_PAGE_SIZE - 1).execute()
+        revoked.update(row['id'] for row in response.data)
+        if len(response.data) < REVOKED_PAGE_SIZE:
+            return revoked
+        offset += REVOKED_PAGE_SIZE
+
+def _refresh_revoked_tokens():
+    global _revoked_tokens, _revoked_next_refresh
+    started = time.monotonic()
+    try:
+        revoked = _load_revoked_tokens()
+    except Exception as e:
+        logging.error(f"Error load revoked sessions: {str(e)}")
+        with _revoked_lock:
+            _revoked_next_refresh = time.monotonic() + REVOKED_RETRY_SECONDS
+        return
+    with _revoked_lock:
+        for token, revoked_at in list(_recent_revocations.items()):
+            if revoked_at < started:
+                del _recent_revocations[token]
+        revoked.update(_recent_revocations)
+        _revoked_tokens = revoked
+        _revoked_next_refresh = time.monotonic() + REVOKED_REFRESH_SECONDS
+
+def is_session_revoked(token):
+    if time.monotonic() >= _revoked_next_refresh:
+        # Cold start: tunggu load pertama. Setelah itu satu thread refresh, yang lain tetap pakai set lama.
+        if _revoked_refresh_lock.acquire(blocking=_revoked_tokens is None):
+            try:
+                if time.monotonic() >= _revoked_next_refresh:
+                    _refresh_revoked_tokens()
+            finally:
+                _revoked_refresh_lock.release()
+    with _revoked_lock:
+        if _revoked_tokens is None:
+            # Daftar revoke belum bisa dimuat: tolak session (fail closed), dicoba lagi tiap REVOKED_RETRY_SECONDS
+            return True
+        return token in _revoked_tokens
+
 def get_session_user(token):
     if not token:
         return None
+    user_id = verify_session_token(token)
+    if not user_id or is_session_revoked(token):
+        return None
+    cached = _session_cache.get(token)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    user = _fetch_user(user_id)
+    if user:
+        if len(_session_cache) >= SESSION_CACHE_MAX:
+            _session_cache.clear()
+        _session_cache[token] = (user, time.monotonic() + SESSION_CACHE_TTL)
+    return user
+
+def _fetch_user(user_id):
     try:
-        response = supabase.table('sessions').select('*').eq('id', token).eq('revoked', False).gt('expires_at', now_utc().isoformat()).execute()
+        response = supabase.table('users').select('id, email').eq('id', user_id).limit(1).execute()
         if not response.data:
             return None
-        user_id = response.data[0]['user_id']
-        user_response = supabase.table('users').select('id, email').eq('id', user_id).execute()
-        if not user_response.data:
-            return None
-        return user_response.data[0]
+        return response.data[0]
     except Exception as e:
         logging.error(f"Error get_session_user: {str(e)}")
         return None
@@ -143,14 +294,58 @@ def get_session_user(token):
 def destroy_session(token):
     if not token:
         return
+    _session_cache.pop(token, None)
     try:
-        supabase.table('sessions').update({'revoked': True}).eq('id', token).execute()
+        supabase.table('sessions').update({'revoked': True}, returning=ReturnMethod.minimal).eq('id', token).execute()
     except Exception as e:
         logging.error(f"Error destroy_session: {str(e)}")
+    with _revoked_lock:
+        _recent_revocations[token] = time.monotonic()
+        if _revoked_tokens is not None:
+            _revoked_tokens.add(token)
+
+# Password (argon2id) dan rate limit login per (IP, email)
+LOGIN_MAX_ATTEMPTS = 5
+LOGIN_WINDOW_SECONDS = 300
+
+_password_hasher = PasswordHasher()
+_login_failures = TTLCache(maxsize=10000, ttl=LOGIN_WINDOW_SECONDS)
+_login_lock = threading.Lock()
+
+def hash_password(password):
+    return _password_hasher.hash(password)
+
+def verify_password(stored, password):
+    # Return (cocok, hash baru kalau perlu disimpan ulang)
+    if not stored:
+        return False, None
+    if stored.startswith('$argon2'):
+        try:
+            _password_hasher.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False, None
+        return True, hash_password(password) if _password_hasher.check_needs_rehash(stored) else None
+    # Akun lama dengan password plaintext: cocokkan lalu upgrade ke argon2
+    if hmac.compare_digest(stored.encode(), password.encode()):
+        return True, hash_password(password)
+    return False, None
+
+def login_attempt_key(email):
+    # remote_addr sudah dikoreksi ProxyFix kalau TRUSTED_PROXY_HOPS diatur
+    return (request.remote_addr, (email or '').strip().lower())
+
+def login_blocked(key):
+    with _login_lock:
+        return _login_failures.get(key, 0) >= LOGIN_MAX_ATTEMPTS
+
+def record_login_failure(key):
+    with _login_lock:
+        _login_failures[key] = _login_failures.get(key, 0) + 1
 
 def current_user():
-    token = request.cookies.get(SESSION_COOKIE_NAME)
-    return get_session_user(token)
+    if 'user' not in g:
+        g.user = get_session_user(request.cookies.get(SESSION_COOKIE_NAME))
+    return g.user
 
 def set_session_cookie(response, token):
     response.set_cookie(
@@ -179,15 +374,19 @@ def register():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
-        if email_exists(email):
-            return render_template('register.html', error='Email sudah digunakan!')
         try:
-            response = supabase.table('users').insert({'email': email, 'password': password}).execute()
+            # UNIQUE index di users.email yang menolak duplikat, tanpa SELECT email_exists dulu
+            response = supabase.table('users').insert({'email': email, 'password': hash_password(password)}).execute()
             user_id = response.data[0]['id']
             token = create_session(user_id)
             resp = make_response(redirect(url_for('index')))
             set_session_cookie(resp, token)
             return resp
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                return render_template('register.html', error='Email sudah digunakan!')
+            logging.error(f"Error register: {str(e)}")
+            return render_template('register.html', error=str(e))
         except Exception as e:
             logging.error(f"Error register: {str(e)}")
             return render_template('register.html', error=str(e))
@@ -197,14 +396,26 @@ def register():
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
-        password = request.form.get('password')
-        response = supabase.table('users').select('*').eq('email', email).eq('password', password).execute()
-        if response.data:
+        password = request.form.get('password') or ''
+        attempt_key = login_attempt_key(email)
+        if login_blocked(attempt_key):
+            return render_template('login.html', error='Terlalu banyak percobaan login! Coba lagi nanti.'), 429
+        response = supabase.table('users').select('id, password').eq('email', email).limit(1).execute()
+        valid, new_hash = verify_password(response.data[0]['password'], password) if response.data else (False, None)
+        if valid:
             user_id = response.data[0]['id']
+            if new_hash:
+                try:
+                    supabase.table('users').update({'password': new_hash}, returning=ReturnMethod.minimal).eq('id', user_id).execute()
+                except Exception as e:
+                    logging.error(f"Error rehash password: {str(e)}")
+            with _login_lock:
+                _login_failures.pop(attempt_key, None)
             token = create_session(user_id)
             resp = make_response(redirect(url_for('index')))
             set_session_cookie(resp, token)
             return resp
+        record_login_failure(attempt_key)
         return render_template('login.html', error='Email atau password salah!')
     return render_template('login.html')
 
@@ -222,22 +433,34 @@ def dashboard():
     if not user:
         return redirect(url_for('login'))
     user_id = user['id']
-    page = int(request.args.get('page', 1))
+    page = max(request.args.get('page', 1, type=int), 1)
     folder_id = request.args.get('folder_id')
     content_type = request.args.get('content_type')
     per_page = 10
 
-    query = supabase.table('links').select('*').eq('user_id', user_id)
-    if folder_id and folder_id.isdigit():
-        query = query.eq('folder_id', int(folder_id))
-    if content_type:
-        query = query.eq('content_type', content_type)
-
-    total_links = len(query.execute().data)
+    def fetch_links(page):
+        # Satu request: halaman links + total dari header Content-Range
+        query = supabase.table('links').select('*', count='exact').eq('user_id', user_id)
+        if folder_id and folder_id.isdigit():
+            query = query.eq('folder_id', int(folder_id))
+        if content_type:
+            query = query.eq('content_type', content_type)
+        return query.order('created_at', desc=True).range((page - 1) * per_page, page * per_page - 1).execute()
+
+    # Folders di pool, links di thread request, jadi keduanya berjalan paralel
+    folders_future = _executor.submit(supabase.table('folders').select('*').eq('user_id', user_id).execute)
+    try:
+        response = fetch_links(page)
+    except APIError as e:
+        # Offset melewati total baris (mis. ?page= lama), PostgREST membalas 416
+        if e.code != RANGE_NOT_SATISFIABLE:
+            raise
+        page = 1
+        response = fetch_links(page)
+    links = response.data
+    total_links = response.count or 0
     total_pages = (total_links + per_page - 1) // per_page
-
-    links = query.order('created_at', desc=True).range((page - 1) * per_page, page * per_page - 1).execute().data
-    folders = supabase.table('folders').select('*').eq('user_id', user_id).execute().data
+    folders = folders_future.result().data
 
     return render_template(
         'dashboard.html',
@@ -261,7 +484,7 @@ def add_folder():
     if folder_name_exists(folder_name, user_id):
         return redirect(url_for('dashboard', error='Nama folder sudah digunakan!'))
     try:
-        supabase.table('folders').insert({'name': folder_name, 'user_id': user_id}).execute()
+        supabase.table('folders').insert({'name': folder_name, 'user_id': user_id}, returning=ReturnMethod.minimal).execute()
         return redirect(url_for('dashboard', success='Folder berhasil ditambahkan!'))
     except Exception as e:
         logging.error(f"Error add folder: {str(e)}")
@@ -277,7 +500,7 @@ def delete_folder(folder_id):
         response = supabase.table('folders').select('id').eq('id', folder_id).eq('user_id', user_id).execute()
         if not response.data:
             return redirect(url_for('dashboard', error='Folder tidak ditemukan atau tidak diizinkan!'))
-        supabase.table('folders').delete().eq('id', folder_id).eq('user_id', user_id).execute()
+        supabase.table('folders').delete(returning=ReturnMethod.minimal).eq('id', folder_id).eq('user_id', user_id).execute()
         return redirect(url_for('dashboard', success='Folder berhasil dihapus!'))
     except Exception as e:
         logging.error(f"Error delete folder: {str(e)}")
@@ -293,10 +516,11 @@ def delete_selected_folders():
     if not selected_folders:
         return redirect(url_for('dashboard', error='Tidak ada folder yang dipilih!'))
     try:
-        response = supabase.table('folders').select('id').eq('user_id', user_id).in_('id', selected_folders).execute()
-        valid_folder_ids = [row['id'] for row in response.data]
-        supabase.table('folders').delete().eq('user_id', user_id).in_('id', valid_folder_ids).execute()
-        return redirect(url_for('dashboard', success='Folder terpilih berhasil dihapus!'))
+        # Filter user_id di DELETE sudah membatasi ke folder milik user
+        response = supabase.table('folders').delete().eq('user_id', user_id).in_('id', selected_folders).execute()
+        if not response.data:
+            return redirect(url_for('dashboard', error='Folder tidak ditemukan atau tidak diizinkan!'))
+        return redirect(url_for('dashboard', success=f'{len(response.data)} folder terpilih berhasil dihapus!'))
     except Exception as e:
         logging.error(f"Error bulk delete folders: {str(e)}")
         return redirect(url_for('dashboard', error='Terjadi kesalahan saat menghapus folder!'))
@@ -315,11 +539,11 @@ def profile():
                 return render_template('profile.html', user=user, error='Email sudah digunakan!')
             updates['email'] = new_email
         if new_password:
-            updates['password'] = new_password
+            updates['password'] = hash_password(new_password)
         if not updates:
             return render_template('profile.html', user=user, error='Tidak ada perubahan yang dilakukan!')
         try:
-            supabase.table('users').update(updates).eq('id', user['id']).execute()
+            supabase.table('users').update(updates, returning=ReturnMethod.minimal).eq('id', user['id']).execute()
             user['email'] = updates.get('email', user['email'])  # Update local user
             return render_template('profile.html', user=user, success='Profil berhasil diperbarui!')
         except Exception as e:
@@ -327,6 +551,10 @@ def profile():
             return render_template('profile.html', user=user, error=f'Gagal memperbarui profil: {str(e)}')
     return render_template('profile.html', user=user)
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return render_template('index.html', user=current_user(), error='Ukuran file terlalu besar! Maksimal 10MB.'), 413
+
 @app.route('/shorten', methods=['POST'])
 def shorten():
     user = current_user()
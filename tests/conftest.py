@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('SUPABASE_URL', 'https://example.supabase.co')
+os.environ.setdefault('SUPABASE_KEY', 'header.payload.signature')
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+import httpx  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return app_module
+
+
+@pytest.fixture
+def postgrest(monkeypatch):
+    """Route PostgREST calls of the real (pinned) client to a handler."""
+    calls = []
+    routes = {}
+
+    def handler(request):
+        calls.append(request)
+        table = request.url.path.rsplit('/', 1)[-1]
+        return routes.get(table, lambda request: httpx.Response(200, json=[]))(request)
+
+    session = type(app_module.supabase.postgrest.session)(
+        base_url=app_module.supabase.postgrest.session.base_url,
+        headers=app_module.supabase.postgrest.session.headers,
+        transport=httpx.MockTransport(handler),
+    )
+    monkeypatch.setattr(app_module.supabase.postgrest, 'session', session)
+    return routes, calls
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Capture render_template calls instead of rendering (some templates link to routes outside this tree)."""
+    calls = []
+
+    def render(name, **context):
+        calls.append((name, context))
+        return name
+
+    monkeypatch.setattr(app_module, 'render_template', render)
+    return calls
+
+
+@pytest.fixture
+def logged_in_client(app, postgrest, monkeypatch):
+    routes, _ = postgrest
+    routes['users'] = lambda request: httpx.Response(200, json=[{'id': 7, 'email': 'a@example.com'}])
+    monkeypatch.setattr(app, '_session_cache', {})
+    monkeypatch.setattr(app, '_revoked_tokens', None)
+    monkeypatch.setattr(app, '_revoked_next_refresh', 0.0)
+    monkeypatch.setattr(app, '_recent_revocations', {})
+    client = app.app.test_client()
+    client.set_cookie(app.SESSION_COOKIE_NAME, app.create_session(7))
+    return client
@@ -0,0 +1,154 @@
+import httpx
+
+
+def rows_response(total):
+    return lambda request: httpx.Response(200, json=[{'short_code': 'abc'}] * min(total, 1))
+
+
+def test_code_exists_fetches_at_most_one_row(app, postgrest):
+    routes, calls = postgrest
+    routes['links'] = rows_response(1)
+    assert app.code_exists('abc') is True
+    assert calls[0].method == 'GET'
+    assert 'count=' not in calls[0].headers.get('Prefer', '')
+    assert calls[0].url.params['limit'] == '1'
+
+
+def test_code_exists_false_when_missing(app, postgrest):
+    routes, _ = postgrest
+    routes['links'] = rows_response(0)
+    assert app.code_exists('abc') is False
+
+
+def test_email_exists_excludes_user(app, postgrest):
+    routes, calls = postgrest
+    routes['users'] = rows_response(1)
+    assert app.email_exists('a@example.com', exclude_user_id=7) is True
+    assert calls[0].url.params['id'] == 'neq.7'
+
+
+def test_folder_name_exists(app, postgrest):
+    routes, _ = postgrest
+    routes['folders'] = rows_response(2)
+    assert app.folder_name_exists('Kerja', 7) is True
+
+
+def test_dashboard_past_last_page_falls_back_to_first(app, postgrest, rendered, logged_in_client):
+    routes, _ = postgrest
+
+    def links(request):
+        if request.url.params['offset'] != '0':
+            return httpx.Response(416, json={'code': 'PGRST103', 'message': 'Requested range not satisfiable'})
+        return httpx.Response(200, json=[{'short_code': 'abc'}], headers={'Content-Range': '0-0/1'})
+
+    routes['links'] = links
+    response = logged_in_client.get('/dashboard?page=9')
+    assert response.status_code == 200
+    name, context = rendered[0]
+    assert name == 'dashboard.html'
+    assert context['page'] == 1
+    assert context['total_pages'] == 1
+    assert context['links'] == [{'short_code': 'abc'}]
+
+
+def test_dashboard_clamps_page_to_one(app, postgrest, rendered, logged_in_client):
+    routes, calls = postgrest
+    routes['links'] = lambda request: httpx.Response(200, json=[], headers={'Content-Range': '*/0'})
+    logged_in_client.get('/dashboard?page=-3')
+    assert rendered[0][1]['page'] == 1
+    assert [c.url.params['offset'] for c in calls if c.url.path.endswith('/links')] == ['0']
+
+
+def test_revoked_token_is_rejected(app, postgrest, logged_in_client):
+    routes, calls = postgrest
+    token = logged_in_client.get_cookie(app.SESSION_COOKIE_NAME).value
+    assert app.get_session_user(token)['id'] == 7
+    routes['sessions'] = lambda request: httpx.Response(200, json=[{'id': token}])
+    app._revoked_next_refresh = 0.0
+    assert app.get_session_user(token) is None
+    load = [c for c in calls if c.method == 'GET' and c.url.path.endswith('/sessions')][-1]
+    assert load.url.params['order'] == 'id'
+
+
+def test_session_rejected_when_revocation_list_cannot_load(app, postgrest, logged_in_client):
+    routes, _ = postgrest
+    token = logged_in_client.get_cookie(app.SESSION_COOKIE_NAME).value
+    routes['sessions'] = lambda request: httpx.Response(500, json={'code': 'XX000', 'message': 'down'})
+    assert app.get_session_user(token) is None
+
+
+def test_logout_revokes_locally(app, postgrest, logged_in_client):
+    token = logged_in_client.get_cookie(app.SESSION_COOKIE_NAME).value
+    assert app.get_session_user(token) is not None
+    app.destroy_session(token)
+    assert app.get_session_user(token) is None
+
+
+def login_routes(app, postgrest, monkeypatch):
+    routes, _ = postgrest
+    monkeypatch.setattr(app, '_login_failures', type(app._login_failures)(maxsize=100, ttl=60))
+    own_hash = app.hash_password('own-password')
+    victim_hash = app.hash_password('victim-password')
+
+    def users(request):
+        email = request.url.params.get('email')
+        if email == 'eq.own@example.com':
+            return httpx.Response(200, json=[{'id': 1, 'password': own_hash}])
+        if email == 'eq.victim@example.com':
+            return httpx.Response(200, json=[{'id': 2, 'password': victim_hash}])
+        return httpx.Response(200, json=[])
+
+    routes['users'] = users
+    return app.app.test_client()
+
+
+def test_own_login_does_not_reset_victim_limit(app, postgrest, rendered, monkeypatch):
+    client = login_routes(app, postgrest, monkeypatch)
+    statuses = []
+    for _ in range(3):
+        for _ in range(app.LOGIN_MAX_ATTEMPTS - 1):
+            statuses.append(client.post('/login', data={'email': 'victim@example.com', 'password': 'guess'}).status_code)
+        assert client.post('/login', data={'email': 'own@example.com', 'password': 'own-password'}).status_code == 302
+    assert 429 in statuses
+
+
+def test_forwarded_for_rotation_does_not_bypass_limit(app, postgrest, rendered, monkeypatch):
+    client = login_routes(app, postgrest, monkeypatch)
+    statuses = [
+        client.post('/login', data={'email': 'victim@example.com', 'password': 'guess'},
+                    headers={'X-Forwarded-For': f'10.0.0.{i}'}).status_code
+        for i in range(app.LOGIN_MAX_ATTEMPTS + 1)
+    ]
+    assert statuses[-1] == 429
+
+
+def signed_token(app, user_id, exp, nonce='nonce'):
+    payload = f'{user_id}.{exp}.{nonce}'
+    return f'{payload}.{app._sign(payload)}'
+
+
+def test_valid_signed_token(app):
+    assert app.verify_session_token(signed_token(app, 7, 4102444800)) == '7'
+
+
+def test_tampered_signature_is_rejected(app):
+    token = signed_token(app, 7, 4102444800)
+    assert app.verify_session_token(token[:-1] + ('0' if token[-1] != '0' else '1')) is None
+    assert app.verify_session_token(signed_token(app, 7, 4102444800).replace('7.', '8.', 1)) is None
+
+
+def test_expired_token_is_rejected(app):
+    assert app.verify_session_token(signed_token(app, 7, 1)) is None
+
+
+def test_malformed_tokens_are_rejected(app):
+    for token in ('', 'abc', '1.2.3', '1.2.3.4.5', '1.2.3.é', '1.².3.' + 'a' * 32, '1.x.3.' + 'a' * 32):
+        assert app.verify_session_token(token) is None
+
+
+def test_non_ascii_cookie_is_treated_as_logged_out(app, postgrest, rendered):
+    client = app.app.test_client()
+    client.set_cookie(app.SESSION_COOKIE_NAME, '1.2.3.é')
+    assert client.get('/dashboard').status_code == 302
+    assert client.get('/').status_code == 200
+    assert rendered[-1][1]['user'] is None